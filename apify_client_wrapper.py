@@ -1,22 +1,123 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import math
+from collections import Counter
 from datetime import date, datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
 
-from apify_client import ApifyClient
+import orjson
+from apify_client import ApifyClient, ApifyClientAsync
 
 from config import AppConfig
+from follower_cache import FollowerCache
 from models import ReelData
+from util import canon_username
 
 logger = logging.getLogger(__name__)
 
+# Apify actors name the same metric differently; keys are tried in order
+REEL_VIEW_KEYS = ("playsCount", "videoPlayCount", "viewsCount", "videoViewCount")
+POST_VIEW_KEYS = ("videoViewCount", "videoPlayCount", "playsCount")
+LIKE_KEYS = ("likesCount", "likes")
+COMMENT_KEYS = ("commentsCount", "comments")
+SHARE_KEYS = ("sharesCount",)
+FOLLOWER_KEYS = ("followersCount", "followers")
+
+# Item types skipped by fetch_posts before parsing (reels are fetched separately)
+VIDEO_TYPES = frozenset({"Video", "video"})
+
+# Terminal run statuses whose dataset still holds the items scraped before the run stopped
+PARTIAL_RUN_STATUSES = frozenset({"TIMED-OUT", "ABORTED"})
+
+# Probe results per actor id, kept for the life of the process: the Streamlit app builds
+# a fresh AppConfig for every run, so a result stored only on the config would be lost
+_per_profile_limit_probed: dict[str, bool] = {}
+
+
+def _first_int(item: dict, keys: tuple[str, ...]) -> int:
+    """Return the first non-zero value among keys, or 0."""
+    for key in keys:
+        value = item.get(key)
+        if value:
+            return value
+    return 0
+
+
+def _finished_dataset_id(run: Optional[dict], label: str) -> str:
+    """Return the run's dataset id; partial runs are logged, failed runs raise RuntimeError."""
+    status = run.get("status") if run else None
+    if status == "SUCCEEDED":
+        return run["defaultDatasetId"]
+    if status in PARTIAL_RUN_STATUSES:
+        logger.warning("  %s: actor run %s finished with status %s, keeping partial results", label, run["id"], status)
+        return run["defaultDatasetId"]
+    run_id = run.get("id", "?") if run else "?"
+    raise RuntimeError(f"actor run {run_id} finished with status {status or 'UNKNOWN'}")
+
+
+@lru_cache(maxsize=4096)
+def _parse_iso_timestamp(value: str) -> datetime:
+    # fromisoformat only accepts a trailing "Z" from Python 3.11 on
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
 
 class ApifyReelsScraper:
     def __init__(self, config: AppConfig):
         self.config = config
         self.client = ApifyClient(config.apify_token)
 
+    def _run_actor(self, actor_id: str, actor_input: dict) -> Iterator[dict]:
+        """Run an actor and stream its dataset page by page."""
+        run = self.client.actor(actor_id).call(run_input=actor_input)
+        dataset_id = _finished_dataset_id(run, actor_id)
+        return self.client.dataset(dataset_id).iterate_items()
+
+    def _run_actor_concurrently(self, actor_id: str, inputs: list[tuple[str, dict]]) -> list[dict]:
+        """Run the actor once per (label, input) pair concurrently and concatenate the items in input order."""
+        if not inputs:
+            return []
+        return asyncio.run(self._run_actor_concurrently_async(actor_id, inputs))
+
+    async def _run_actor_concurrently_async(self, actor_id: str, inputs: list[tuple[str, dict]]) -> list[dict]:
+        # The async client is created per event loop; its HTTP pool can't be shared across asyncio.run calls
+        aclient = ApifyClientAsync(self.config.apify_token)
+        semaphore = asyncio.Semaphore(self.config.max_concurrency)
+
+        async def run_one(label: str, actor_input: dict) -> list[dict]:
+            async with semaphore:
+                started = await aclient.actor(actor_id).start(run_input=actor_input)
+                run = await aclient.run(started["id"]).wait_for_finish()
+                dataset_id = _finished_dataset_id(run, label)
+                # Every run's items are collected before parsing anyway, so fetch the raw JSON
+                # in one request and decode it with orjson rather than paging through iterate_items()
+                raw = await aclient.dataset(dataset_id).get_items_as_bytes(item_format="json")
+                items = orjson.loads(raw)
+            logger.info("  %s: received %d items", label, len(items))
+            return items
+
+        # One failed run must not cancel the others: their runs keep going on Apify either way
+        results = await asyncio.gather(
+            *(run_one(label, actor_input) for label, actor_input in inputs), return_exceptions=True
+        )
+        all_items: list[dict] = []
+        failed: list[str] = []
+        for (label, _), result in zip(inputs, results):
+            if isinstance(result, Exception):
+                failed.append(f"{label}: {result}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                all_items.extend(result)
+
+        if failed:
+            if len(failed) == len(inputs):
+                raise RuntimeError(f"All {len(inputs)} actor runs failed: " + "; ".join(failed))
+            logger.warning("%d of %d actor runs failed, keeping the rest: %s", len(failed), len(inputs), "; ".join(failed))
+        return all_items
+
     def fetch_reels(
         self,
         usernames: list[str],
@@ -26,46 +127,77 @@ class ApifyReelsScraper:
     ) -> list[ReelData] | tuple[list[ReelData], list[dict]]:
         logger.info("Starting Apify actor %s for %d users", self.config.actor_id, len(usernames))
 
-        all_items: list[dict] = []
-
-        # Fetch reels per user separately so resultsLimit applies per profile
-        for username in usernames:
-            actor_input = {
-                "username": [username],
-                "resultsLimit": self.config.max_reels_per_profile,
-            }
-            logger.info("Fetching reels for @%s (limit=%d)", username, self.config.max_reels_per_profile)
-
-            run = self.client.actor(self.config.actor_id).call(run_input=actor_input)
-            dataset_id = run["defaultDatasetId"]
-            items = self.client.dataset(dataset_id).list_items().items
-            logger.info("  @%s: received %d items", username, len(items))
-            all_items.extend(items)
-
-        logger.info("Total received: %d items from %d users", len(all_items), len(usernames))
+        items = None
+        if len(usernames) > 1 and self._per_profile_limit_supported() is not False:
+            items = self._fetch_reels_batched(usernames)
+
+        if items is None:
+            # Fetch reels per user separately so resultsLimit applies per profile
+            def build_input(username: str) -> dict:
+                logger.info("Fetching reels for @%s (limit=%d)", username, self.config.max_reels_per_profile)
+                return {
+                    "username": [username],
+                    "resultsLimit": self.config.max_reels_per_profile,
+                }
+
+            items = self._run_actor_concurrently(
+                self.config.actor_id, [(f"@{u}", build_input(u)) for u in usernames]
+            )
 
-        reels = []
-        skipped_date = 0
-        skipped_parse = 0
-        for item in all_items:
-            reel = self._parse_item(item)
-            if reel is None:
-                skipped_parse += 1
-                continue
-            # Client-side date filtering
-            if reel.taken_at and not (start_date <= reel.taken_at.date() <= end_date):
-                skipped_date += 1
-                continue
-            reels.append(reel)
+        stats: Counter = Counter()
+        raw_items: list[dict] = []
+        reels = list(self._iter_parsed(
+            items, start_date, end_date, stats,
+            raw_items=raw_items if return_raw else None,
+        ))
 
         logger.info(
             "Filtering: %d reels in date range, %d outside range, %d failed to parse (from %d total)",
-            len(reels), skipped_date, skipped_parse, len(all_items),
+            len(reels), stats["date"], stats["parse"], stats["total"],
         )
         if return_raw:
-            return reels, all_items
+            return reels, raw_items
         return reels
 
+    def _per_profile_limit_supported(self) -> Optional[bool]:
+        """Configured value if set, otherwise the result of an earlier probe in this process (None if unprobed)."""
+        if self.config.per_profile_limit_supported is not None:
+            return self.config.per_profile_limit_supported
+        return _per_profile_limit_probed.get(self.config.actor_id)
+
+    def _fetch_reels_batched(self, usernames: list[str]) -> Optional[Iterable[dict]]:
+        """Fetch reels for all users in one actor run.
+
+        Returns None when the run may have been truncated by a global resultsLimit,
+        in which case the caller falls back to one run per user.
+        """
+        limit = self.config.max_reels_per_profile
+        logger.info("Fetching reels for %d users in one run (limit=%d)", len(usernames), limit)
+        items = self._run_actor(
+            self.config.actor_id,
+            {"username": usernames, "resultsLimit": limit},
+        )
+
+        if self._per_profile_limit_supported() is None:
+            # Probing needs the full count, so materialize this one run
+            items = list(items)
+            if logger.isEnabledFor(logging.INFO):
+                per_user = Counter(item.get("ownerUsername", "unknown") for item in items)
+                logger.info("  Items per user: %s", dict(per_user))
+            if len(items) > limit:
+                # A global cap could never return more than the limit
+                self._record_per_profile_limit(True)
+                logger.info("resultsLimit is applied per profile, keeping batched runs")
+            elif len(items) == limit:
+                self._record_per_profile_limit(False)
+                logger.info("resultsLimit looks global, falling back to one run per user")
+                return None
+        return items
+
+    def _record_per_profile_limit(self, supported: bool) -> None:
+        self.config.per_profile_limit_supported = supported
+        _per_profile_limit_probed[self.config.actor_id] = supported
+
     def fetch_posts(
         self,
         usernames: list[str],
@@ -77,164 +209,150 @@ class ApifyReelsScraper:
         post_actor = "apify/instagram-scraper"
         logger.info("Starting Apify actor %s for %d users", post_actor, len(usernames))
 
-        all_items: list[dict] = []
-
-        for username in usernames:
-            actor_input = {
+        def build_input(username: str) -> dict:
+            logger.info("Fetching posts for @%s (limit=%d, since=%s)", username, self.config.max_reels_per_profile, start_date)
+            return {
                 "directUrls": [f"https://www.instagram.com/{username}/"],
                 "resultsType": "posts",
                 "resultsLimit": self.config.max_reels_per_profile,
                 "onlyPostsNewerThan": start_date.isoformat(),
             }
-            logger.info("Fetching posts for @%s (limit=%d, since=%s)", username, self.config.max_reels_per_profile, start_date)
 
-            run = self.client.actor(post_actor).call(run_input=actor_input)
-            dataset_id = run["defaultDatasetId"]
-            items = self.client.dataset(dataset_id).list_items().items
-            logger.info("  @%s: received %d items", username, len(items))
-            all_items.extend(items)
+        all_items = self._run_actor_concurrently(post_actor, [(f"@{u}", build_input(u)) for u in usernames])
 
         logger.info("Total received: %d items from %d users", len(all_items), len(usernames))
 
-        posts = []
-        skipped_type = 0
-        skipped_date = 0
-        skipped_parse = 0
-        for item in all_items:
-            # Skip Video (reels) — keep only Sidecar (carousels) and Image (photos)
-            item_type = item.get("type", "")
-            if item_type in ("Video", "video"):
-                skipped_type += 1
-                continue
-
-            parsed = self._parse_post_item(item)
-            if parsed is None:
-                skipped_parse += 1
-                continue
-            # Safety date check
-            if parsed.taken_at and not (start_date <= parsed.taken_at.date() <= end_date):
-                skipped_date += 1
-                continue
-            posts.append(parsed)
+        # Skip Video (reels) — keep only Sidecar (carousels) and Image (photos)
+        stats: Counter = Counter()
+        posts = list(self._iter_parsed(
+            all_items, start_date, end_date, stats,
+            url_prefix="p", view_keys=POST_VIEW_KEYS, skip_types=VIDEO_TYPES,
+        ))
 
         logger.info(
             "Filtering: %d posts kept, %d skipped (video/reel), %d outside date, %d failed to parse (from %d total)",
-            len(posts), skipped_type, skipped_date, skipped_parse, len(all_items),
+            len(posts), stats["type"], stats["date"], stats["parse"], len(all_items),
         )
         if return_raw:
             return posts, all_items
         return posts
 
-    def _parse_post_item(self, item: dict) -> Optional[ReelData]:
-        """Parse a post item from apify/instagram-scraper."""
-        try:
-            username = (
-                item.get("ownerUsername", "")
-                or item.get("username", "")
-            )
-            author = item.get("author", {}) or {}
-            if not username:
-                username = author.get("username", "")
-
-            shortcode = item.get("shortCode", "") or item.get("code", "")
-            url = item.get("url", "")
-            if not url and shortcode:
-                url = f"https://www.instagram.com/p/{shortcode}/"
-
-            taken_at = None
-            timestamp = item.get("timestamp")
-            if timestamp:
-                if isinstance(timestamp, str):
-                    taken_at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-                elif isinstance(timestamp, (int, float)):
-                    taken_at = datetime.fromtimestamp(timestamp)
-
-            views = (
-                item.get("videoViewCount", 0)
-                or item.get("videoPlayCount", 0)
-                or item.get("playsCount", 0)
-                or 0
-            )
-            likes = item.get("likesCount", 0) or item.get("likes", 0) or 0
-            comments = item.get("commentsCount", 0) or item.get("comments", 0) or 0
-            shares = item.get("sharesCount", 0) or 0
-            caption = item.get("caption", "") or ""
+    def _iter_parsed(
+        self,
+        items: Iterable[dict],
+        start_date: date,
+        end_date: date,
+        stats: Counter,
+        url_prefix: str = "reel",
+        view_keys: tuple[str, ...] = REEL_VIEW_KEYS,
+        skip_types: frozenset[str] = frozenset(),
+        raw_items: Optional[list[dict]] = None,
+    ) -> Iterator[ReelData]:
+        """Parse and date-filter items in a single pass.
+
+        Skipped items are tallied in stats under "type", "parse" and "date";
+        every consumed item is counted under "total" and, if given, appended to raw_items.
+        """
+        parse = self._parse_item
+        for item in items:
+            stats["total"] += 1
+            if raw_items is not None:
+                raw_items.append(item)
+            if skip_types and item.get("type", "") in skip_types:
+                stats["type"] += 1
+                continue
 
-            return ReelData(
-                username=username,
-                shortcode=shortcode,
-                url=url,
-                taken_at=taken_at,
-                views=views,
-                likes=likes,
-                comments=comments,
-                shares=shares,
-                caption=caption,
-            )
-        except Exception as e:
-            logger.warning("Failed to parse post item: %s", e)
-            return None
+            parsed = parse(item, url_prefix, view_keys)
+            if parsed is None:
+                stats["parse"] += 1
+                continue
+            # Client-side date filtering
+            if parsed.taken_date and not (start_date <= parsed.taken_date <= end_date):
+                stats["date"] += 1
+                continue
+            yield parsed
 
     def fetch_follower_counts(self, usernames: list[str]) -> dict[str, int]:
-        logger.info("Fetching follower counts for %d users via %s", len(usernames), self.config.profile_actor_id)
+        if not self.config.follower_cache_file:
+            return self._scrape_follower_counts(usernames)
+
+        cache = FollowerCache(self.config.follower_cache_file, self.config.follower_cache_ttl)
+        cached = cache.get_many(usernames)
+        # Keyed by the caller's interned strings rather than the new ones read back from SQLite
+        counts = {u: cached[u] for u in usernames if u in cached}
+        missing = [u for u in usernames if u not in cached]
+        logger.info("Follower counts cached for %d users, %d to fetch", len(counts), len(missing))
+        if missing:
+            fetched = self._scrape_follower_counts(missing)
+            cache.set_many(fetched)
+            counts.update(fetched)
+        return counts
 
-        actor_input = {
-            "usernames": usernames,
-        }
+    def _scrape_follower_counts(self, usernames: list[str]) -> dict[str, int]:
+        logger.info("Fetching follower counts for %d users via %s", len(usernames), self.config.profile_actor_id)
 
-        run = self.client.actor(self.config.profile_actor_id).call(run_input=actor_input)
-        dataset_id = run["defaultDatasetId"]
-        items = self.client.dataset(dataset_id).list_items().items
+        # Split users into shards scraped by concurrent actor runs
+        shard_size = max(1, math.ceil(len(usernames) / self.config.follower_workers))
+        shards = [usernames[i:i + shard_size] for i in range(0, len(usernames), shard_size)]
+        items = self._run_actor_concurrently(
+            self.config.profile_actor_id,
+            [(f"profiles {n + 1}/{len(shards)}", {"usernames": shard}) for n, shard in enumerate(shards)],
+        )
 
         counts = {}
         for item in items:
             username = item.get("username", "")
-            followers = item.get("followersCount", 0) or item.get("followers", 0)
+            followers = _first_int(item, FOLLOWER_KEYS)
             if username:
-                counts[username] = followers
+                counts[canon_username(username)] = followers
 
         logger.info("Got follower counts for %d users", len(counts))
         return counts
 
-    def _parse_item(self, item: dict) -> Optional[ReelData]:
+    def _parse_item(
+        self,
+        item: dict,
+        url_prefix: str = "reel",
+        view_keys: tuple[str, ...] = REEL_VIEW_KEYS,
+    ) -> Optional[ReelData]:
+        """Parse a reel or post item; url_prefix is "reel" or "p" for the fallback URL."""
         try:
-            author = item.get("author", {}) or {}
+            get = item.get
+            author = get("author") or {}
             username = (
                 author.get("username", "")
-                or item.get("ownerUsername", "")
-                or item.get("username", "")
+                or get("ownerUsername", "")
+                or get("username", "")
             )
 
-            shortcode = item.get("shortCode", "") or item.get("code", "")
-            url = item.get("url", "")
+            shortcode = get("shortCode", "") or get("code", "")
+            url = get("url", "")
             if not url and shortcode:
-                url = f"https://www.instagram.com/reel/{shortcode}/"
+                url = f"https://www.instagram.com/{url_prefix}/{shortcode}/"
 
             taken_at = None
-            timestamp = item.get("timestamp")
+            timestamp = get("timestamp")
             if timestamp:
                 if isinstance(timestamp, str):
-                    taken_at = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+                    taken_at = _parse_iso_timestamp(timestamp)
                 elif isinstance(timestamp, (int, float)):
                     taken_at = datetime.fromtimestamp(timestamp)
+            taken_date = taken_at.date() if taken_at else None
+            taken_at_str = taken_at.strftime("%Y-%m-%d %H:%M") if taken_at else ""
 
-            views = (
-                item.get("playsCount", 0)
-                or item.get("videoPlayCount", 0)
-                or item.get("viewsCount", 0)
-                or item.get("videoViewCount", 0)
-                or 0
-            )
-            likes = item.get("likesCount", 0) or item.get("likes", 0) or 0
-            comments = item.get("commentsCount", 0) or item.get("comments", 0) or 0
-            shares = item.get("sharesCount", 0) or 0
-            caption = item.get("caption", "") or ""
+            views = _first_int(item, view_keys)
+            likes = _first_int(item, LIKE_KEYS)
+            comments = _first_int(item, COMMENT_KEYS)
+            shares = _first_int(item, SHARE_KEYS)
+            caption = get("caption", "") or ""
 
             return ReelData(
-                username=username,
+                username=canon_username(username),
                 shortcode=shortcode,
                 url=url,
                 taken_at=taken_at,
+                taken_date=taken_date,
+                taken_at_str=taken_at_str,
                 views=views,
                 likes=likes,
                 comments=comments,
@@ -242,5 +360,5 @@ class ApifyReelsScraper:
                 caption=caption,
             )
         except Exception as e:
-            logger.warning("Failed to parse reel item: %s", e)
+            logger.warning("Failed to parse item: %s", e)
             return None
@@ -1,21 +1,80 @@
 from __future__ import annotations
 
-import csv
-import io
-import json
 import logging
-import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 
+import orjson
+import pandas as pd
 import streamlit as st
 
 from apify_client_wrapper import ApifyReelsScraper
 from config import AppConfig
-from data_processor import enrich_with_followers, filter_viral_reels
+from data_processor import process_reels, read_competitors_csv
+from models import ReelData
 from sheets_exporter import export_to_sheets
+from util import canon_username
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+RAW_ITEM_COLUMNS = [
+    "type", "timestamp", "url", "videoPlayCount", "likesCount",
+    "likes", "commentsCount", "comments", "sharesCount",
+]
+RAW_PREVIEW_LIMIT = 5000
+# Follower counts drift, so they go stale sooner than content; shared by the in-memory and on-disk caches
+FOLLOWER_CACHE_TTL = 1800
+
+
+# Cached Apify calls: reruns with the same inputs (e.g. after changing a threshold)
+# don't start new actor runs. Callers pass sorted tuples so the cache key is stable.
+# Entries hold every raw item, so their number is capped.
+
+@st.cache_data(ttl=3600, max_entries=16, show_spinner=False)
+def cached_fetch_content(
+    apify_token: str,
+    content_type: str,
+    usernames: tuple[str, ...],
+    start_date: date,
+    end_date: date,
+    max_reels: int,
+) -> tuple[list[ReelData], list[dict]]:
+    scraper = ApifyReelsScraper(AppConfig(apify_token=apify_token, max_reels_per_profile=max_reels))
+    if content_type == "Reels":
+        return scraper.fetch_reels(list(usernames), start_date, end_date, return_raw=True)
+    return scraper.fetch_posts(list(usernames), start_date, end_date, return_raw=True)
+
+
+@st.cache_data(ttl=FOLLOWER_CACHE_TTL, max_entries=64, show_spinner=False)
+def cached_fetch_follower_counts(apify_token: str, usernames: tuple[str, ...]) -> dict[str, int]:
+    scraper = ApifyReelsScraper(AppConfig(apify_token=apify_token, follower_cache_ttl=FOLLOWER_CACHE_TTL))
+    return scraper.fetch_follower_counts(list(usernames))
+
+
+def build_results_frame(reels: list[ReelData], include_views: bool, include_url: bool = True) -> pd.DataFrame:
+    """Reels table built column by column."""
+    columns = {
+        "Username": [r.username for r in reels],
+        "Followers": [r.follower_count for r in reels],
+    }
+    if include_url:
+        columns["URL"] = [r.url for r in reels]
+    columns["Date"] = [r.taken_at_str for r in reels]
+    if include_views:
+        columns["Views"] = [r.views for r in reels]
+    columns["Likes"] = [r.likes for r in reels]
+    columns["Comments"] = [r.comments for r in reels]
+    columns["ER (%)"] = [r.engagement_rate for r in reels]
+    columns["Caption"] = [r.caption for r in reels]
+    return pd.DataFrame(columns)
+
+
+@st.cache_data(show_spinner=False)
+def results_to_csv(df: pd.DataFrame) -> bytes:
+    """Serialize the results table once per result set instead of on every rerun."""
+    return df.to_csv(index=False).encode("utf-8")
+
+
 st.set_page_config(page_title="Instagram Content Parser", page_icon="🎬", layout="wide")
 st.title("Instagram Content Parser")
 st.caption("Find viral content among your competitors")
@@ -71,7 +130,7 @@ with col1:
     st.subheader("Competitors")
     input_mode = st.radio("Input mode", ["Type usernames", "Upload CSV"], horizontal=True)
 
-    usernames_raw = ""
+    usernames: list[str] = []
     csv_followers: dict[str, int] = {}
 
     if input_mode == "Type usernames":
@@ -84,6 +143,7 @@ with col1:
             placeholder="cristiano\ntheweeknd\ninstagram",
             height=150,
         )
+        usernames = [canon_username(u) for u in usernames_raw.strip().splitlines() if u.strip()]
         # Save to URL query params so they persist across reloads
         if usernames_raw.strip():
             names_csv = ",".join(u.strip() for u in usernames_raw.strip().splitlines() if u.strip())
@@ -93,21 +153,11 @@ with col1:
     else:
         uploaded_csv = st.file_uploader("Upload CSV (columns: username, followers)", type=["csv"])
         if uploaded_csv is not None:
-            content = uploaded_csv.getvalue().decode("utf-8")
-            reader = csv.DictReader(io.StringIO(content))
-            lines = []
-            for row in reader:
-                username = row.get("username", "").strip().lstrip("@")
-                if username:
-                    lines.append(username)
-                    f = row.get("followers", "").strip()
-                    if f:
-                        try:
-                            csv_followers[username] = int(f)
-                        except ValueError:
-                            pass
-            usernames_raw = "\n".join(lines)
-            st.info(f"Loaded {len(lines)} usernames from CSV")
+            try:
+                usernames, csv_followers = read_competitors_csv(uploaded_csv)
+                st.info(f"Loaded {len(usernames)} usernames from CSV")
+            except ValueError as e:
+                st.error(str(e))
 
 with col2:
     st.subheader("Content type")
@@ -118,9 +168,6 @@ with col2:
     start_date = st.date_input("Start date", value=today - timedelta(days=3))
     end_date = st.date_input("End date", value=today)
 
-# Parse usernames
-usernames = [u.strip().lstrip("@") for u in usernames_raw.strip().splitlines() if u.strip()]
-
 # ── Run button ──
 
 st.markdown("---")
@@ -142,16 +189,23 @@ if st.button("Run parser", type="primary", disabled=not can_run):
         min_engagement_rate=min_er,
     )
 
-    scraper = ApifyReelsScraper(config)
+    # Start fetching follower counts in the background, it doesn't depend on the content run
+    users_without = [u for u in usernames if u not in csv_followers]
+    followers_pool = ThreadPoolExecutor(max_workers=1)
+    followers_future = None
+    if users_without:
+        followers_future = followers_pool.submit(
+            cached_fetch_follower_counts, apify_token, tuple(sorted(users_without))
+        )
+    followers_pool.shutdown(wait=False)
 
     # Fetch content
     content_label = "reels" if content_type == "Reels" else "posts"
     try:
         with st.spinner(f"Fetching {content_label} for {len(usernames)} accounts via Apify..."):
-            if content_type == "Reels":
-                results, raw_items = scraper.fetch_reels(usernames, start_date, end_date, return_raw=True)
-            else:
-                results, raw_items = scraper.fetch_posts(usernames, start_date, end_date, return_raw=True)
+            results, raw_items = cached_fetch_content(
+                apify_token, content_type, tuple(sorted(usernames)), start_date, end_date, max_reels
+            )
     except Exception as e:
         st.error(f"Apify error: {e}")
         st.stop()
@@ -161,20 +215,10 @@ if st.button("Run parser", type="primary", disabled=not can_run):
 
     # Debug: show raw Apify response
     with st.expander(f"Raw Apify data ({len(raw_items)} items)", expanded=False):
-        raw_rows = []
-        for item in raw_items:
-            raw_rows.append({
-                "type": item.get("type", "?"),
-                "timestamp": item.get("timestamp", "?"),
-                "url": (item.get("url", "") or "")[:80],
-                "videoPlayCount": item.get("videoPlayCount", ""),
-                "likesCount": item.get("likesCount", ""),
-                "likes": item.get("likes", ""),
-                "commentsCount": item.get("commentsCount", ""),
-                "comments": item.get("comments", ""),
-                "sharesCount": item.get("sharesCount", ""),
-            })
-        st.dataframe(raw_rows, use_container_width=True, hide_index=True)
+        # Only the listed keys are extracted; rows are capped to keep Streamlit serialization cheap
+        raw_df = pd.DataFrame(raw_items[:RAW_PREVIEW_LIMIT], columns=RAW_ITEM_COLUMNS)
+        raw_df["url"] = raw_df["url"].fillna("").astype(str).str.slice(0, 80)
+        st.dataframe(raw_df, use_container_width=True, hide_index=True)
         # Show first item's full keys for debugging
         if raw_items:
             st.code(f"Available fields: {sorted(raw_items[0].keys())}")
@@ -183,39 +227,28 @@ if st.button("Run parser", type="primary", disabled=not can_run):
         st.warning(f"No {content_label} found. Check usernames and date range.")
         st.stop()
 
-    # Fetch followers if needed
-    users_without = [u for u in usernames if u not in csv_followers]
+    # Collect follower counts started above
     api_followers: dict[str, int] = {}
-    if users_without:
+    if followers_future is not None:
         try:
-            with st.spinner(f"Fetching follower counts for {len(users_without)} users..."):
-                api_followers = scraper.fetch_follower_counts(users_without)
+            if followers_future.done():
+                api_followers = followers_future.result()
+            else:
+                with st.spinner(f"Fetching follower counts for {len(users_without)} users..."):
+                    api_followers = followers_future.result()
         except Exception as e:
             st.warning(f"Could not fetch follower counts: {e}")
 
-    enrich_with_followers(reels, api_followers, csv_followers)
+    # Also sets follower_count and engagement_rate on every fetched item
+    viral = process_reels(reels, api_followers, csv_followers, config, is_posts=(content_type != "Reels"))
 
     # Show ALL fetched items before filtering
     with st.expander(f"All fetched {content_label} ({len(reels)})", expanded=False):
-        all_rows = []
-        for r in reels:
-            from data_processor import calculate_engagement_rate
-            r.engagement_rate = calculate_engagement_rate(r)
-            row = {
-                "Username": r.username,
-                "Followers": r.follower_count,
-                "Date": r.taken_at.strftime("%Y-%m-%d %H:%M") if r.taken_at else "",
-            }
-            if content_type == "Reels":
-                row["Views"] = r.views
-            row["Likes"] = r.likes
-            row["Comments"] = r.comments
-            row["ER (%)"] = r.engagement_rate
-            row["Caption"] = r.caption
-            all_rows.append(row)
-        st.dataframe(all_rows, use_container_width=True, hide_index=True)
-
-    viral = filter_viral_reels(reels, config, is_posts=(content_type != "Reels"))
+        st.dataframe(
+            build_results_frame(reels, include_views=(content_type == "Reels"), include_url=False),
+            use_container_width=True,
+            hide_index=True,
+        )
 
     if content_type == "Reels":
         st.success(f"Found **{len(viral)}** viral {content_label} (min views: {min_views:,}, min ER: {min_er}%)")
@@ -226,8 +259,10 @@ if st.button("Run parser", type="primary", disabled=not can_run):
         st.info(f"No {content_label} matched the thresholds. Try lowering the minimums.")
         st.stop()
 
-    # Store results in session
+    # Store results in session; tables are built once here rather than on every rerun
+    results_df = build_results_frame(viral, include_views=(content_type == "Reels"))
     st.session_state["viral_reels"] = viral
+    st.session_state["results_df"] = results_df
     st.session_state["config"] = config
     st.session_state["content_type"] = content_type
 
@@ -236,35 +271,14 @@ if st.button("Run parser", type="primary", disabled=not can_run):
 if "viral_reels" in st.session_state:
     viral = st.session_state["viral_reels"]
     saved_content_type = st.session_state.get("content_type", "Reels")
+    results_df = st.session_state["results_df"]
 
-    rows = []
-    for r in viral:
-        row = {
-            "Username": r.username,
-            "Followers": r.follower_count,
-            "URL": r.url,
-            "Date": r.taken_at.strftime("%Y-%m-%d %H:%M") if r.taken_at else "",
-        }
-        if saved_content_type == "Reels":
-            row["Views"] = r.views
-        row["Likes"] = r.likes
-        row["Comments"] = r.comments
-        row["ER (%)"] = r.engagement_rate
-        row["Caption"] = r.caption
-        rows.append(row)
-
-    st.dataframe(rows, use_container_width=True, hide_index=True)
+    st.dataframe(results_df, use_container_width=True, hide_index=True)
 
     # CSV download
-    csv_buffer = io.StringIO()
-    if rows:
-        writer = csv.DictWriter(csv_buffer, fieldnames=rows[0].keys())
-        writer.writeheader()
-        writer.writerows(rows)
-
     st.download_button(
         "Download CSV",
-        data=csv_buffer.getvalue(),
+        data=results_to_csv(results_df),
         file_name="viral_reels.csv",
         mime="text/csv",
     )
@@ -283,12 +297,9 @@ if "viral_reels" in st.session_state:
         config = st.session_state.get("config", AppConfig())
 
         if sa_json_file is not None:
-            tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".json", mode="w")
-            sa_data = json.loads(sa_json_file.getvalue().decode("utf-8"))
-            json.dump(sa_data, tmp)
-            tmp.close()
-            config.service_account_file = tmp.name
+            config.service_account_info = orjson.loads(sa_json_file.getvalue())
         elif use_secrets_sa:
+            config.service_account_info = None
             config.service_account_file = "__streamlit_secrets__"
 
         try:
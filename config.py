@@ -1,7 +1,6 @@
 from dataclasses import dataclass, field
 from pathlib import Path
-
-import yaml
+from typing import Optional
 
 
 @dataclass
@@ -11,6 +10,14 @@ class AppConfig:
     actor_id: str = "apify/instagram-reel-scraper"
     profile_actor_id: str = "apify/instagram-profile-scraper"
     max_reels_per_profile: int = 50
+    max_concurrency: int = 16
+    follower_workers: int = 8
+    # None = not probed yet; set after the first batched reels run
+    per_profile_limit_supported: Optional[bool] = None
+
+    # Follower counts cached on disk between runs; empty path disables the cache
+    follower_cache_file: str = ".cache/followers.sqlite3"
+    follower_cache_ttl: int = 86400
 
     # Thresholds
     min_views: int = 100_000
@@ -18,6 +25,8 @@ class AppConfig:
 
     # Google Sheets
     service_account_file: str = "service_account.json"
+    # Parsed service account JSON; takes precedence over service_account_file
+    service_account_info: Optional[dict] = None
     spreadsheet_name: str = "Viral Reels Report"
     worksheet_name: str = "Reels"
 
@@ -31,18 +40,28 @@ def load_config(config_path: str = "config.yaml") -> AppConfig:
     if not path.exists():
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
+    import yaml
+
+    # libyaml's C loader when PyYAML was built with it, same safe semantics
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     with open(path) as f:
-        raw = yaml.safe_load(f)
+        raw = yaml.load(f, Loader=loader)
 
     apify = raw.get("apify", {})
     thresholds = raw.get("thresholds", {})
     sheets = raw.get("google_sheets", {})
+    cache = raw.get("cache", {})
 
     return AppConfig(
         apify_token=apify.get("token", ""),
         actor_id=apify.get("actor_id", "apify/instagram-reel-scraper"),
         profile_actor_id=apify.get("profile_actor_id", "apify/instagram-profile-scraper"),
         max_reels_per_profile=apify.get("max_reels_per_profile", 50),
+        max_concurrency=apify.get("max_concurrency", 16),
+        follower_workers=apify.get("follower_workers", 8),
+        per_profile_limit_supported=apify.get("per_profile_limit_supported"),
+        follower_cache_file=cache.get("follower_cache_file", ".cache/followers.sqlite3"),
+        follower_cache_ttl=cache.get("follower_cache_ttl", 86400),
         min_views=thresholds.get("min_views", 100_000),
         min_engagement_rate=thresholds.get("min_engagement_rate", 3.0),
         service_account_file=sheets.get("service_account_file", "service_account.json"),
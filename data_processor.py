@@ -1,48 +1,79 @@
+import numpy as np
+import pandas as pd
+
 from config import AppConfig
 from models import ReelData
+from util import canon_username
+
+
+def read_competitors_csv(source) -> tuple[list[str], dict[str, int]]:
+    """Read a CSV (path or file object) with a 'username' column and an optional 'followers' column.
+
+    Raises ValueError if there is no 'username' column. Follower counts that aren't plain integers are ignored.
+    """
+    try:
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        df = pd.DataFrame()
+    if "username" not in df.columns:
+        raise ValueError(f"CSV must have a 'username' column. Found: {list(df.columns)}")
 
+    names = df["username"].map(canon_username)
+    has_name = names.str.len() > 0
+    names = names[has_name]
 
-def calculate_engagement_rate(reel: ReelData) -> float:
-    """ER = (likes + comments) / followers * 100"""
-    if reel.follower_count <= 0:
-        return 0.0
-    engagement = reel.likes + reel.comments
-    return round((engagement / reel.follower_count) * 100, 2)
+    followers_map: dict[str, int] = {}
+    if "followers" in df.columns:
+        followers = df.loc[has_name, "followers"].str.strip()
+        # Same values int() accepted: "1.5" and "1e3" are skipped rather than truncated or expanded
+        known = followers.str.fullmatch(r"[+-]?\d+")
+        followers_map = dict(zip(names[known].tolist(), followers[known].astype("int64").tolist()))
 
+    return names.tolist(), followers_map
 
-def enrich_with_followers(
+
+def process_reels(
     reels: list[ReelData],
-    follower_counts: dict[str, int],
+    api_followers: dict[str, int],
     csv_followers: dict[str, int],
-) -> None:
-    for reel in reels:
-        if reel.follower_count > 0:
-            continue
-        reel.follower_count = (
-            csv_followers.get(reel.username, 0)
-            or follower_counts.get(reel.username, 0)
-        )
+    config: AppConfig,
+    is_posts: bool = False,
+) -> list[ReelData]:
+    """Fill in follower counts, set engagement_rate on every reel and return the viral ones, best first.
 
+    The reel list is walked once in Python; ER, thresholds and ranking run on NumPy columns.
+    """
+    # CSV counts win over API counts; one lookup per reel instead of two
+    followers_by_user = api_followers | {u: f for u, f in csv_followers.items() if f > 0}
+    lookup = followers_by_user.get
 
-def filter_viral_reels(reels: list[ReelData], config: AppConfig, is_posts: bool = False) -> list[ReelData]:
+    columns = []
     for reel in reels:
-        reel.engagement_rate = calculate_engagement_rate(reel)
+        if reel.follower_count <= 0:
+            reel.follower_count = lookup(reel.username, 0)
+        columns.append((reel.likes, reel.comments, reel.follower_count, reel.views))
+    likes, comments, followers, views = np.array(columns, dtype=np.int64).reshape(-1, 4).T
 
+    # ER = (likes + comments) / followers * 100, 0 without followers. Computed in int64 as
+    # hundredths of a percent rounded half up, then scaled, so .xx5 ties don't depend on float rounding
+    safe_followers = np.maximum(followers, 1)
+    er_x100 = ((likes + comments) * 20000 + safe_followers) // (2 * safe_followers)
+    er = np.where(followers > 0, er_x100, 0) / 100.0
+    for reel, rate in zip(reels, er.tolist()):
+        reel.engagement_rate = rate
+
+    keep = er >= config.min_engagement_rate
     if is_posts:
         # Posts/Carousels: no views filter, sort by likes
-        viral = [
-            reel
-            for reel in reels
-            if reel.engagement_rate >= config.min_engagement_rate
-        ]
-        viral.sort(key=lambda r: r.likes, reverse=True)
+        rank = likes
     else:
         # Reels: filter by views, sort by views
-        viral = [
-            reel
-            for reel in reels
-            if reel.views >= config.min_views
-            and reel.engagement_rate >= config.min_engagement_rate
-        ]
-        viral.sort(key=lambda r: r.views, reverse=True)
-    return viral
+        rank = views
+        keep &= views >= config.min_views
+
+    # Object array so selection and ordering are pointer copies in C, not a Python loop
+    reel_array = np.empty(len(reels), dtype=object)
+    reel_array[:] = reels
+    # Stable sort on the negated key keeps the original order for ties, like list.sort(reverse=True)
+    order = np.argsort(-rank[keep], kind="stable")
+    return reel_array[keep][order].tolist()
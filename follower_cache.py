@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+# Stay under SQLite's default limit on bound parameters per statement
+_QUERY_CHUNK = 500
+
+
+class FollowerCache:
+    """Follower counts persisted in SQLite so repeated runs don't re-scrape the same profiles.
+
+    Rows are keyed by canonical usernames (see util.canon_username).
+    """
+
+    def __init__(self, path: str, ttl_seconds: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS followers ("
+            "username TEXT PRIMARY KEY, count INTEGER NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        return conn
+
+    def get_many(self, usernames: list[str]) -> dict[str, int]:
+        wanted = list(set(usernames))
+        cutoff = time.time() - self.ttl_seconds
+        rows = []
+        try:
+            with closing(self._connect()) as conn:
+                for i in range(0, len(wanted), _QUERY_CHUNK):
+                    chunk = wanted[i:i + _QUERY_CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += conn.execute(
+                        f"SELECT username, count FROM followers WHERE fetched_at >= ? AND username IN ({placeholders})",
+                        (cutoff, *chunk),
+                    ).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Follower cache unavailable (%s): %s", self.path, e)
+            return {}
+        return dict(rows)
+
+    def set_many(self, counts: dict[str, int]) -> None:
+        if not counts:
+            return
+        now = time.time()
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO followers (username, count, fetched_at) VALUES (?, ?, ?)",
+                    [(username, count, now) for username, count in counts.items()],
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("Could not update follower cache (%s): %s", self.path, e)
@@ -1,12 +1,11 @@
 import argparse
-import csv
 import logging
 import sys
 from datetime import date
 
 from apify_client_wrapper import ApifyReelsScraper
 from config import load_config
-from data_processor import enrich_with_followers, filter_viral_reels
+from data_processor import process_reels, read_competitors_csv
 from sheets_exporter import export_to_sheets
 
 logging.basicConfig(
@@ -19,29 +18,11 @@ logger = logging.getLogger(__name__)
 
 def parse_csv(csv_path: str) -> tuple[list[str], dict[str, int]]:
     """Read CSV with 'username' column and optional 'followers' column."""
-    usernames = []
-    followers_map = {}
-
-    with open(csv_path, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        if "username" not in (reader.fieldnames or []):
-            logger.error("CSV must have a 'username' column. Found: %s", reader.fieldnames)
-            sys.exit(1)
-
-        for row in reader:
-            username = row["username"].strip().lstrip("@")
-            if not username:
-                continue
-            usernames.append(username)
-            followers_str = row.get("followers", "").strip()
-            if followers_str:
-                try:
-                    followers_map[username] = int(followers_str)
-                except ValueError:
-                    pass
-
-    return usernames, followers_map
+    try:
+        return read_competitors_csv(csv_path)
+    except ValueError as e:
+        logger.error("%s", e)
+        sys.exit(1)
 
 
 def main():
@@ -95,8 +76,7 @@ def main():
         api_followers = scraper.fetch_follower_counts(users_without_followers)
 
     # Enrich and filter
-    enrich_with_followers(reels, api_followers, csv_followers)
-    viral = filter_viral_reels(reels, config)
+    viral = process_reels(reels, api_followers, csv_followers, config)
 
     logger.info(
         "Found %d viral reels (min views: %d, min ER: %.1f%%)",
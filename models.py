@@ -1,17 +1,20 @@
 from __future__ import annotations
 
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import date, datetime
 from typing import Optional
 
-from pydantic import BaseModel
 
-
-class ReelData(BaseModel):
+@dataclass(slots=True)
+class ReelData:
     username: str
     follower_count: int = 0
     shortcode: str = ""
     url: str = ""
     taken_at: Optional[datetime] = None
+    # Derived from taken_at once at parse time
+    taken_date: Optional[date] = None
+    taken_at_str: str = ""
     views: int = 0
     likes: int = 0
     comments: int = 0
@@ -1,26 +1,57 @@
 from __future__ import annotations
 
 import logging
-
-import gspread
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
 from config import AppConfig
 from models import ReelData
 
+if TYPE_CHECKING:
+    import gspread
+
 logger = logging.getLogger(__name__)
 
+# gspread is slow to import and only needed on export, so it's imported inside these functions.
+# Clients are cached so the authorized session and its access token are reused across exports.
+
+
+@lru_cache(maxsize=4)
+def _client_for_file(path: str) -> gspread.Client:
+    import gspread
+
+    return gspread.service_account(filename=path)
+
+
+@lru_cache(maxsize=4)
+def _client_for_info(info: frozenset) -> gspread.Client:
+    import gspread
+
+    return gspread.service_account_from_dict(dict(info))
+
 
 def _get_gspread_client(config: AppConfig) -> gspread.Client:
-    """Authenticate with gspread via file or Streamlit secrets."""
+    """Authenticate with gspread via in-memory credentials, file or Streamlit secrets."""
+    if config.service_account_info:
+        return _client_for_info(frozenset(config.service_account_info.items()))
     if config.service_account_file == "__streamlit_secrets__":
         import streamlit as st
 
         creds_dict = dict(st.secrets["google_sheets"])
-        return gspread.service_account_from_dict(creds_dict)
-    return gspread.service_account(filename=config.service_account_file)
+        return _client_for_info(frozenset(creds_dict.items()))
+    return _client_for_file(config.service_account_file)
+
+
+def _cell(value) -> dict:
+    """CellData for updateCells; strings are stored as-is, like valueInputOption=RAW."""
+    if isinstance(value, (int, float)):
+        return {"userEnteredValue": {"numberValue": value}}
+    return {"userEnteredValue": {"stringValue": str(value)}}
 
 
 def export_to_sheets(reels: list[ReelData], config: AppConfig, is_posts: bool = False, spreadsheet_url: str = "") -> str:
+    import gspread
+
     gc = _get_gspread_client(config)
 
     if spreadsheet_url:
@@ -37,7 +68,6 @@ def export_to_sheets(reels: list[ReelData], config: AppConfig, is_posts: bool =
     sheet_name = "Posts" if is_posts else "Reels"
     try:
         worksheet = spreadsheet.worksheet(sheet_name)
-        worksheet.clear()
     except gspread.WorksheetNotFound:
         worksheet = spreadsheet.add_worksheet(
             title=sheet_name,
@@ -53,7 +83,7 @@ def export_to_sheets(reels: list[ReelData], config: AppConfig, is_posts: bool =
                 reel.username,
                 reel.follower_count,
                 reel.url,
-                reel.taken_at.strftime("%Y-%m-%d %H:%M") if reel.taken_at else "",
+                reel.taken_at_str,
                 reel.likes,
                 reel.comments,
                 reel.engagement_rate,
@@ -67,7 +97,7 @@ def export_to_sheets(reels: list[ReelData], config: AppConfig, is_posts: bool =
                 reel.username,
                 reel.follower_count,
                 reel.url,
-                reel.taken_at.strftime("%Y-%m-%d %H:%M") if reel.taken_at else "",
+                reel.taken_at_str,
                 reel.views,
                 reel.likes,
                 reel.comments,
@@ -75,7 +105,27 @@ def export_to_sheets(reels: list[ReelData], config: AppConfig, is_posts: bool =
                 reel.caption,
             ])
 
-    worksheet.update(range_name="A1", values=rows)
+    # Resize the grid to exactly fit the data, then write every cell, in one batchUpdate round-trip.
+    # The write covers the whole resized grid, so no separate clear is needed.
+    sheet_id = worksheet.id
+    spreadsheet.batch_update({"requests": [
+        {
+            "updateSheetProperties": {
+                "properties": {
+                    "sheetId": sheet_id,
+                    "gridProperties": {"rowCount": len(rows), "columnCount": len(headers)},
+                },
+                "fields": "gridProperties.rowCount,gridProperties.columnCount",
+            }
+        },
+        {
+            "updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": [{"values": [_cell(v) for v in row]} for row in rows],
+                "fields": "userEnteredValue",
+            }
+        },
+    ]})
 
     url = spreadsheet.url
     logger.info("Exported %d items to Google Sheets: %s", len(reels), url)
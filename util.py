@@ -0,0 +1,9 @@
+import sys
+
+
+def canon_username(raw: str) -> str:
+    """Normalize a username ("  @Name " -> "name") and intern it, so every dict keyed by it shares one string.
+
+    Instagram usernames are case-insensitive; typed, CSV and scraped names all go through here.
+    """
+    return sys.intern(raw.strip().lstrip("@").lower())